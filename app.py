@@ -1,24 +1,58 @@
 """FastAPI application for bill extraction."""
 import os
-import tempfile
-from typing import Dict
-from fastapi import FastAPI, HTTPException
+import threading
+from typing import Dict, Optional
+from fastapi import FastAPI, Header, HTTPException
 from pydantic import BaseModel
 from ocr_engine import OCREngine
+from ocr_backends import DEFAULT_BACKEND, BACKENDS
+from parallel_ocr import ParallelOCR
+from scheduler import CostScheduler, SCHEDULER_WORKERS
 from extractor import BillExtractor
-from utils import download_file
+from job_queue import JobQueue
+from pipeline import ExtractionError, run_extraction
+from profiler import maybe_profile, should_profile
 
 
 app = FastAPI(title="Bill Extraction API")
 
+# OCR worker processes per backend; pages are handed over through shared memory when > 1
+OCR_PROCESSES = int(os.environ.get('OCR_PROCESSES', '1'))
+
+
+def make_ocr_engine(backend: Optional[str] = None):
+    """
+    Create an OCR engine, parallelized across processes and placed behind the
+    cost-aware scheduler if configured.
+    """
+    engine = OCREngine(backend=backend)
+    if OCR_PROCESSES > 1:
+        engine = ParallelOCR(engine, processes=OCR_PROCESSES)
+    if SCHEDULER_WORKERS > 0:
+        engine = CostScheduler(engine, workers=SCHEDULER_WORKERS)
+    return engine
+
+
 # Initialize components
-ocr_engine = OCREngine()
+ocr_engine = make_ocr_engine()
+ocr_engines = {ocr_engine.backend.name: ocr_engine}
+# Engines may own process pools and scheduler threads; create each one only once
+ocr_engines_lock = threading.Lock()
 extractor = BillExtractor(y_tolerance=12)
+job_queue = JobQueue()
 
 
 class DocumentRequest(BaseModel):
     """Request model for document extraction."""
     document: str
+    ocr_backend: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    """Request model for asynchronous extraction jobs."""
+    document: str
+    y_tolerance: float = 12
+    ocr_backend: Optional[str] = None
 
 
 class TokenUsage(BaseModel):
@@ -35,6 +69,48 @@ class ExtractionResponse(BaseModel):
     data: Dict
 
 
+class JobStatusResponse(BaseModel):
+    """Status of an asynchronous extraction job."""
+    job_id: str
+    status: str
+    pages_done: int = 0
+    pages_total: Optional[int] = None
+    result: Optional[ExtractionResponse] = None
+    error: Optional[str] = None
+
+
+def resolve_backend(backend: Optional[str]) -> str:
+    """Return the OCR backend name to use, rejecting unknown backends."""
+    name = backend or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown OCR backend: {name}. Available: {', '.join(sorted(BACKENDS))}"
+        )
+    return name
+
+
+def get_ocr_engine(backend: Optional[str]):
+    """Return the OCR engine for a backend, loading it on first use."""
+    name = resolve_backend(backend)
+    with ocr_engines_lock:
+        if name not in ocr_engines:
+            ocr_engines[name] = make_ocr_engine(name)
+        return ocr_engines[name]
+
+
+def to_job_status(job: Dict) -> JobStatusResponse:
+    """Convert a job queue record to the API response model."""
+    return JobStatusResponse(
+        job_id=job['id'],
+        status=job['status'],
+        pages_done=job['pages_done'],
+        pages_total=job['pages_total'],
+        result=job['result'],
+        error=job['error']
+    )
+
+
 @app.get("/")
 def root():
     """Health check endpoint."""
@@ -42,39 +118,26 @@ def root():
 
 
 @app.post("/extract-bill-data")
-def extract_bill_data(request: DocumentRequest) -> ExtractionResponse:
+def extract_bill_data(
+    request: DocumentRequest,
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
+) -> ExtractionResponse:
     """
     Extract line items and totals from bill document.
     
     Args:
-        request: Contains document URL or path
+        request: Contains document URL or path and optional OCR backend
+        x_profile: Set together with a valid `X-Admin-Token` to profile this request
+        x_admin_token: Admin token (`PROFILE_ADMIN_TOKEN`)
         
     Returns:
         Structured bill data
     """
-    temp_file = None
+    engine = get_ocr_engine(request.ocr_backend)
     try:
-        # Download or get file
-        document_url = request.document
-        
-        if document_url.startswith('http://') or document_url.startswith('https://'):
-            # Download from URL
-            temp_file = download_file(document_url)
-            file_path = temp_file
-        else:
-            # Local file path
-            file_path = document_url
-            if not os.path.exists(file_path):
-                raise HTTPException(status_code=400, detail=f"File not found: {file_path}")
-        
-        # Process document with OCR
-        page_tokens = ocr_engine.process_document(file_path)
-        
-        if not page_tokens:
-            raise HTTPException(status_code=500, detail="Failed to extract text from document")
-        
-        # Extract structured data
-        extracted_data = extractor.extract_from_document(page_tokens)
+        with maybe_profile(should_profile(x_profile, x_admin_token), label='extract'):
+            extracted_data = run_extraction(request.document, engine, extractor)
         
         return ExtractionResponse(
             is_success=True,
@@ -82,18 +145,41 @@ def extract_bill_data(request: DocumentRequest) -> ExtractionResponse:
             data=extracted_data
         )
     
-    except HTTPException:
-        raise
+    except ExtractionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+
+
+@app.post("/jobs")
+def submit_job(request: JobRequest) -> JobStatusResponse:
+    """
+    Queue a document for asynchronous extraction.
     
-    finally:
-        # Cleanup temp file
-        if temp_file and os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+    Resubmitting the same document with the same settings returns the existing job.
+    Jobs are processed by `worker.py`.
+    """
+    # Only validated here; the engine itself is loaded by the worker
+    backend = resolve_backend(request.ocr_backend)
+    job = job_queue.submit(request.document, {'y_tolerance': request.y_tolerance, 'ocr_backend': backend})
+    return to_job_status(job)
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Stop scheduler threads and OCR worker processes and release shared memory."""
+    for engine in ocr_engines.values():
+        if hasattr(engine, 'close'):
+            engine.close()
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str) -> JobStatusResponse:
+    """Return status, per-page progress and (once done) the extraction result of a job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return to_job_status(job)
 
 
 if __name__ == "__main__":
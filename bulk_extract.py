@@ -0,0 +1,291 @@
+"""Bulk extraction over many stored bills, without going through HTTP.
+
+Documents are processed across a process pool (OCR and extraction engines are
+loaded once per worker) and results are written to sharded JSONL files. A
+checkpoint file in the output directory records every finished document, so
+an interrupted run can be restarted with the same arguments and only the
+remaining documents are processed.
+
+Shards are append-only, so a document can have more than one record across
+shards: `--retry-failed` writes a new record for each retried failure, and a
+crash between writing a result and checkpointing it repeats that document on
+resume. Consumers should keep the last record per `document`.
+
+Usage:
+    python bulk_extract.py /data/bills --output-dir out/ --workers 8
+    python bulk_extract.py "/data/bills/2024-*/*.pdf" --output-dir out/
+    python bulk_extract.py --manifest bills.txt --output-dir out/ --retry-failed
+"""
+import argparse
+import collections
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from ocr_engine import OCREngine
+from extractor import BillExtractor
+from pipeline import run_extraction
+
+
+DOCUMENT_EXTENSIONS = {'.pdf', '.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp'}
+CHECKPOINT_FILE = 'checkpoint.tsv'
+
+
+def collect_documents(inputs: List[str], manifest: Optional[str]) -> List[str]:
+    """
+    Expand directories, glob patterns and a manifest into a sorted, de-duplicated list.
+
+    Manifest lines are either plain paths/URLs or JSON objects with a `document` key.
+    """
+    documents = []
+    for item in inputs:
+        if os.path.isdir(item):
+            documents.extend(
+                str(p) for p in Path(item).rglob('*')
+                if p.is_file() and p.suffix.lower() in DOCUMENT_EXTENSIONS
+            )
+        elif glob.has_magic(item):
+            documents.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        else:
+            documents.append(item)
+
+    if manifest:
+        with open(manifest) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                documents.append(json.loads(line)['document'] if line.startswith('{') else line)
+
+    return sorted(set(documents))
+
+
+def load_checkpoint(path: str, retry_failed: bool) -> Set[str]:
+    """Return documents that are finished and must not be processed again."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            # A torn last line from an interrupted run is ignored
+            if len(parts) != 2:
+                continue
+            document, status = parts
+            if status == 'ok' or not retry_failed:
+                done.add(document)
+    return done
+
+
+class ShardWriter:
+    """Append JSON records to numbered JSONL shards of bounded size."""
+
+    def __init__(self, output_dir: str, shard_size: int):
+        self.output_dir = output_dir
+        self.shard_size = shard_size
+        existing = sorted(Path(output_dir).glob('results-*.jsonl'))
+        # Never append to a shard from an earlier (possibly interrupted) run
+        self.shard = int(existing[-1].stem.split('-')[1]) + 1 if existing else 0
+        self.count = 0
+        self.file = None
+
+    def write(self, record: Dict):
+        if self.file is None or self.count >= self.shard_size:
+            self.close()
+            path = os.path.join(self.output_dir, f'results-{self.shard:05d}.jsonl')
+            self.file = open(path, 'w', encoding='utf-8')
+            self.shard += 1
+            self.count = 0
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# Per-worker engines, created once by the pool initializer
+_ocr_engine = None
+_extractor = None
+
+
+def _init_worker(ocr_backend: Optional[str], pdf_renderer: Optional[str], y_tolerance: float):
+    global _ocr_engine, _extractor
+    # Parallelism comes from the pool; tesseract's own OpenMP threads would oversubscribe the CPUs
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    _ocr_engine = OCREngine(backend=ocr_backend, renderer=pdf_renderer)
+    _extractor = BillExtractor(y_tolerance=y_tolerance)
+
+
+def _process(document: str) -> Dict:
+    """Worker task: extract one document and return its output record."""
+    start = time.perf_counter()
+    try:
+        data = run_extraction(document, _ocr_engine, _extractor)
+        record = {'document': document, 'is_success': True, 'data': data}
+        pages = len(data['pagewise_line_items'])
+    except Exception as e:
+        record = {'document': document, 'is_success': False, 'error': str(e)}
+        pages = 0
+    record['pages'] = pages
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def _crash_record(document: str, error: Exception) -> Dict:
+    """Record of a document whose worker process died while processing it."""
+    return {'document': document, 'is_success': False,
+            'error': f"Worker process crashed: {error}", 'pages': 0, 'seconds': 0.0}
+
+
+def print_progress(done: int, total: int, pages: int, failed: int, started: float, final: bool = False):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    line = (f"\r{done}/{total} docs  {done / elapsed:.2f} docs/s  "
+            f"{pages / elapsed:.2f} pages/s  failed={failed}  elapsed={elapsed:.0f}s")
+    sys.stdout.write(line + ('\n' if final else ''))
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk bill extraction to sharded JSONL")
+    parser.add_argument('inputs', nargs='*', help="Directories, glob patterns or file paths")
+    parser.add_argument('--manifest', help="File listing documents (paths/URLs or JSON lines)")
+    parser.add_argument('--output-dir', required=True, help="Directory for shards and the checkpoint")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument('--shard-size', type=int, default=1000, help="Records per JSONL shard")
+    parser.add_argument('--retry-failed', action='store_true', help="Reprocess documents that failed before")
+    parser.add_argument('--ocr-backend', default=None, help="OCR backend (tesseract, paddle)")
+    parser.add_argument('--pdf-renderer', default=None, help="PDF renderer (pdfium, poppler)")
+    parser.add_argument('--y-tolerance', type=float, default=12, help="Row clustering tolerance (pixels)")
+    parser.add_argument('--progress-interval', type=float, default=2.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    if not args.inputs and not args.manifest:
+        parser.error("Provide input paths/globs or --manifest")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(args.output_dir, CHECKPOINT_FILE)
+
+    documents = collect_documents(args.inputs, args.manifest)
+    finished = load_checkpoint(checkpoint_path, args.retry_failed)
+    pending = [d for d in documents if d not in finished]
+    print(f"Found {len(documents)} documents, {len(documents) - len(pending)} already done, "
+          f"{len(pending)} to process with {args.workers} workers")
+    if not pending:
+        return
+
+    writer = ShardWriter(args.output_dir, args.shard_size)
+    done = pages = failed = 0
+    started = last_report = time.monotonic()
+    # Bounded number of outstanding tasks keeps memory flat on huge inputs
+    max_in_flight = args.workers * 4
+    queue = iter(pending)
+
+    def start_pool() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=args.workers,
+            initializer=_init_worker,
+            initargs=(args.ocr_backend, args.pdf_renderer, args.y_tolerance)
+        )
+
+    in_flight: Dict[Future, str] = {}
+    # Documents that were in flight when a worker crashed. Most of them were
+    # only queued, so each is retried on its own in the new pool: the one that
+    # crashes it again is recorded as failed and the others are not blamed.
+    suspects = collections.deque()
+    isolated = None  # Suspect currently running alone
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        def finish(record: Dict):
+            nonlocal done, pages, failed
+            # Result first, then checkpoint: a crash in between only repeats work
+            writer.write(record)
+            status = 'ok' if record['is_success'] else 'failed'
+            checkpoint.write(f"{record['document']}\t{status}\n")
+            checkpoint.flush()
+            done += 1
+            pages += record['pages']
+            failed += int(not record['is_success'])
+
+        pool = start_pool()
+        try:
+            while True:
+                broken = False
+                if not in_flight:
+                    isolated = None
+                while not broken and isolated is None:
+                    if suspects:
+                        if in_flight:
+                            break
+                        document = isolated = suspects.popleft()
+                    elif len(in_flight) < max_in_flight:
+                        document = next(queue, None)
+                        if document is None:
+                            break
+                    else:
+                        break
+                    try:
+                        in_flight[pool.submit(_process, document)] = document
+                    except BrokenProcessPool:
+                        # The pool broke since the last wait; this document never ran
+                        if document == isolated:
+                            suspects.appendleft(document)
+                            isolated = None
+                        else:
+                            queue = itertools.chain([document], queue)
+                        broken = True
+
+                if not in_flight and not broken:
+                    break
+
+                if not broken:
+                    completed, _ = wait(in_flight, timeout=args.progress_interval,
+                                        return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        if isinstance(future.exception(), BrokenProcessPool):
+                            broken = True
+                        else:
+                            del in_flight[future]
+                            finish(future.result())
+
+                if broken:
+                    # A worker died (e.g. OOM-killed on a huge scan) and took the pool
+                    # and every task in it with it
+                    print("\nWorker process crashed; restarting the pool and retrying in-flight documents")
+                    for future in wait(in_flight).done:
+                        document = in_flight.pop(future)
+                        error = future.exception()
+                        if not isinstance(error, BrokenProcessPool):
+                            finish(future.result())
+                        elif document == isolated:
+                            # Crashed its worker again while running alone
+                            finish(_crash_record(document, error))
+                        else:
+                            suspects.append(document)
+                    isolated = None
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = start_pool()
+
+                if time.monotonic() - last_report >= args.progress_interval:
+                    print_progress(done, len(pending), pages, failed, started)
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            print("\nInterrupted; rerun the same command to resume")
+            raise
+        finally:
+            pool.shutdown(cancel_futures=True)
+            writer.close()
+
+    print_progress(done, len(pending), pages, failed, started, final=True)
+    print(f"Results written to: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,60 @@
 """Extract structured data from OCR tokens."""
 import re
 from typing import List, Dict, Optional, Tuple
+import numpy as np
 from rapidfuzz import fuzz
 from utils import normalize_text, extract_number, clean_item_name
 
 
+# Roles assigned to numeric columns, from the rightmost column leftwards
+COLUMN_ROLES = ['amount', 'rate', 'quantity']
+
+
+class ColumnTemplate:
+    """Numeric column layout of a bill table, shared by all pages of a document."""
+    
+    def __init__(self, centers: np.ndarray):
+        """
+        Initialize template.
+        
+        Args:
+            centers: Sorted x positions (right edges) of the detected numeric columns
+        """
+        self.centers = centers
+        # Bucket edges halfway between neighbouring columns
+        self.boundaries = (centers[1:] + centers[:-1]) / 2
+        # Rightmost column is the amount, then rate, then quantity; others are ignored
+        n = len(centers)
+        self.roles = [None] * n
+        for i, role in enumerate(COLUMN_ROLES[:n]):
+            self.roles[n - 1 - i] = role
+    
+    def lookup(self, xs: List[float], tolerance: float) -> List[Optional[str]]:
+        """Map token x positions to column roles (None if no column lies within `tolerance`)."""
+        xs = np.asarray(xs, dtype=float)
+        buckets = np.searchsorted(self.boundaries, xs)
+        near = np.abs(xs - self.centers[buckets]) <= tolerance
+        return [self.roles[b] if ok else None for b, ok in zip(buckets, near)]
+
+
 class BillExtractor:
     """Extract bill items and totals from OCR tokens."""
     
-    def __init__(self, y_tolerance: float = 12):
+    def __init__(self, y_tolerance: float = 12, column_bin_width: float = 20,
+                 template_pages: int = 2, min_column_support: int = 3):
         """
         Initialize extractor.
         
         Args:
             y_tolerance: Vertical tolerance for row clustering (pixels)
+            column_bin_width: Histogram bin width for column detection (pixels)
+            template_pages: Number of leading item pages used to infer the column template
+            min_column_support: Minimum numeric tokens for a histogram peak to count as a column
         """
         self.y_tolerance = y_tolerance
+        self.column_bin_width = column_bin_width
+        self.template_pages = template_pages
+        self.min_column_support = min_column_support
     
     def cluster_rows(self, tokens: List[Dict]) -> List[List[Dict]]:
         """Cluster tokens into rows based on Y-coordinate."""
@@ -57,18 +96,8 @@ class BillExtractor:
         else:
             return 'Bill Detail'
     
-    def extract_row_data(self, row: List[Dict]) -> Optional[Dict]:
-        """Extract item data from a row of tokens."""
-        if not row:
-            return None
-        
-        # Sort tokens by X coordinate
-        sorted_row = sorted(row, key=lambda t: t['x1'])
-        
-        # Extract text
-        row_text = ' '.join([t['text'] for t in sorted_row])
-        
-        # Skip header rows and total rows
+    def is_skipped_row(self, row_text: str) -> bool:
+        """Whether a row is a header or total row rather than a line item."""
         lower_text = row_text.lower()
         skip_keywords = [
             'item', 'description', 'particular', 'qty', 'quantity', 'rate', 'amount',
@@ -79,36 +108,102 @@ class BillExtractor:
         if any(keyword in lower_text for keyword in skip_keywords):
             # Check if it's actually a data row with numbers
             if not re.search(r'\d{2,}', row_text):
-                return None
+                return True
+        return False
+    
+    def infer_column_template(self, page_tokens: List[Tuple[int, List[Dict]]]) -> Optional[ColumnTemplate]:
+        """
+        Detect numeric column positions once per document.
         
-        # Try to identify columns
-        # Typical pattern: Item Name | Qty | Rate | Amount
-        # Amount is usually the rightmost number
-        # Rate is usually second from right
-        # Qty is usually third from right or a small number
+        Builds an x-projection histogram of the right edges of numeric tokens
+        in the item rows of the first pages and takes its peaks as columns.
+        Numbers in a table column are right-aligned, so their right edges pile
+        up in a few bins while stray numbers stay scattered. Header and total
+        rows are left out, as `extract_row_data` skips them too.
         
-        numbers = []
-        item_name_tokens = []
+        Returns:
+            ColumnTemplate, or None if no column layout stands out
+        """
+        positions = []
+        pages_used = 0
+        for _, tokens in page_tokens:
+            xs = []
+            for row in self.cluster_rows(tokens):
+                row_text = ' '.join(t['text'] for t in sorted(row, key=lambda t: t['x1']))
+                if self.is_skipped_row(row_text):
+                    continue
+                xs.extend(t['x2'] for t in row if extract_number(t['text']) is not None)
+            if len(xs) < self.min_column_support:
+                continue
+            positions.extend(xs)
+            pages_used += 1
+            if pages_used >= self.template_pages:
+                break
+        
+        if not positions:
+            return None
         
-        for i, token in enumerate(sorted_row):
-            text = token['text']
-            # Try to extract number
-            num = extract_number(text)
-            if num is not None:
-                numbers.append({
-                    'value': num,
-                    'position': i,
-                    'x': token['x1'],
-                    'text': text
-                })
-            else:
-                # Likely part of item name
-                item_name_tokens.append(text)
+        xs = np.asarray(positions, dtype=float)
+        n_bins = int(xs.max() // self.column_bin_width) + 1
+        hist = np.bincount((xs // self.column_bin_width).astype(int), minlength=n_bins)
+        # Smooth so a column straddling two bins still forms a single peak
+        smoothed = np.convolve(hist, [1, 2, 1], mode='same') / 2
+        
+        padded = np.concatenate(([0], smoothed, [0]))
+        is_peak = (
+            (padded[1:-1] >= padded[:-2]) &
+            (padded[1:-1] > padded[2:]) &
+            (smoothed >= self.min_column_support)
+        )
+        peak_bins = np.flatnonzero(is_peak)
+        if len(peak_bins) == 0:
+            return None
         
-        # Need at least amount
-        if not numbers:
+        # Column position is the mean right edge of the tokens around each peak
+        bins = (xs // self.column_bin_width).astype(int)
+        centers = np.array([xs[np.abs(bins - b) <= 1].mean() for b in peak_bins])
+        return ColumnTemplate(np.sort(centers))
+    
+    def assign_columns(self, numbers: List[Dict], template: ColumnTemplate) -> Optional[Tuple[float, Optional[float], Optional[float]]]:
+        """
+        Assign numeric tokens of a row to columns using the document template.
+        
+        Returns:
+            (amount, rate, quantity), or None if the row does not fit the template
+        """
+        tolerance = 3 * self.column_bin_width
+        values = {}
+        for number, role in zip(numbers, template.lookup([n['x2'] for n in numbers], tolerance)):
+            if role is not None:
+                # Keep the rightmost token if several fall into the same column
+                values[role] = number['value']
+        
+        if 'amount' not in values:
+            return None
+        # Several numbers but none in the rate/quantity columns: the row does not fit the template
+        if len(values) == 1 and len(numbers) > 1:
             return None
         
+        amount = values['amount']
+        rate = values.get('rate')
+        quantity = values.get('quantity')
+        
+        if rate is None and quantity is None:
+            rate = amount
+            quantity = 1.0
+        elif rate is None:
+            rate = amount / quantity if quantity > 0 else amount
+        elif quantity is None:
+            quantity = amount / rate if rate > 0 else 1.0
+        
+        return amount, rate, quantity
+    
+    def guess_columns(self, numbers: List[Dict]) -> Tuple[float, Optional[float], Optional[float]]:
+        """
+        Guess (amount, rate, quantity) from the right-to-left order of a row's numbers.
+        
+        Used when no column template is available or the row does not fit it.
+        """
         # Sort numbers by X position (right to left)
         numbers_sorted = sorted(numbers, key=lambda n: n['x'], reverse=True)
         
@@ -139,6 +234,65 @@ class BillExtractor:
             rate = amount
             quantity = 1.0
         
+        return amount, rate, quantity
+        
+    def extract_row_data(self, row: List[Dict], template: Optional[ColumnTemplate] = None) -> Optional[Dict]:
+        """
+        Extract item data from a row of tokens.
+        
+        Args:
+            row: Tokens of one row
+            template: Document column template; when given, numbers are assigned
+                to columns by position, falling back to the heuristic otherwise
+        """
+        if not row:
+            return None
+        
+        # Sort tokens by X coordinate
+        sorted_row = sorted(row, key=lambda t: t['x1'])
+        
+        # Extract text
+        row_text = ' '.join([t['text'] for t in sorted_row])
+        
+        # Skip header rows and total rows
+        if self.is_skipped_row(row_text):
+            return None
+        
+        # Try to identify columns
+        # Typical pattern: Item Name | Qty | Rate | Amount
+        # Amount is usually the rightmost number
+        # Rate is usually second from right
+        # Qty is usually third from right or a small number
+        
+        numbers = []
+        item_name_tokens = []
+        
+        for i, token in enumerate(sorted_row):
+            text = token['text']
+            # Try to extract number
+            num = extract_number(text)
+            if num is not None:
+                numbers.append({
+                    'value': num,
+                    'position': i,
+                    'x': token['x1'],
+                    'x2': token['x2'],
+                    'text': text
+                })
+            else:
+                # Likely part of item name
+                item_name_tokens.append(text)
+        
+        # Need at least amount
+        if not numbers:
+            return None
+        
+        columns = self.assign_columns(numbers, template) if template is not None else None
+        if columns is not None:
+            amount, rate, quantity = columns
+        else:
+            amount, rate, quantity = self.guess_columns(numbers)
+        
         # Build item name from remaining tokens
         item_name = ' '.join(item_name_tokens).strip()
         if not item_name:
@@ -226,8 +380,9 @@ class BillExtractor:
         
         return totals
     
-    def extract_page_items(self, page_num: int, tokens: List[Dict]) -> Dict:
-        """Extract all items from a single page."""
+    def extract_page_items(self, page_num: int, tokens: List[Dict],
+                           template: Optional[ColumnTemplate] = None) -> Dict:
+        """Extract all items from a single page, using the document column template if given."""
         # Cluster tokens into rows
         rows = self.cluster_rows(tokens)
         
@@ -237,7 +392,7 @@ class BillExtractor:
         # Extract items from each row
         items = []
         for row in rows:
-            item = self.extract_row_data(row)
+            item = self.extract_row_data(row, template)
             if item:
                 items.append(item)
         
@@ -263,8 +418,11 @@ class BillExtractor:
         pagewise_line_items = []
         all_items = []
         
+        # Column layout is shared by every page; infer it once and reuse it
+        template = self.infer_column_template(page_tokens)
+        
         for page_num, tokens in page_tokens:
-            page_data = self.extract_page_items(page_num, tokens)
+            page_data = self.extract_page_items(page_num, tokens, template)
             pagewise_line_items.append(page_data)
             all_items.extend(page_data['bill_items'])
         
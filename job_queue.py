@@ -0,0 +1,217 @@
+"""Durable job queue for asynchronous extraction, backed by a local SQLite file."""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+
+DEFAULT_DB_PATH = os.environ.get('JOB_DB_PATH', 'jobs.db')
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    document TEXT NOT NULL,
+    config TEXT NOT NULL,
+    status TEXT NOT NULL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+
+def compute_job_id(document: str, config: Dict) -> str:
+    """
+    Derive a deterministic job id from the document and extraction config.
+
+    Local files are identified by their content so that a changed file at the
+    same path is treated as a new job; URLs are identified by the URL itself.
+    """
+    digest = hashlib.sha256()
+    if os.path.isfile(document):
+        with open(document, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        digest.update(document.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class JobQueue:
+    """SQLite-backed job queue shared by the API process and worker processes."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, lease_seconds: float = 300, max_attempts: int = 3):
+        """
+        Initialize queue.
+
+        Args:
+            db_path: Path to the SQLite database file
+            lease_seconds: A running job whose heartbeat is older than this is
+                assumed to belong to a dead worker and is handed out again
+            max_attempts: Number of claims after which a job is marked failed
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode; multi-statement updates use explicit transactions
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def submit(self, document: str, config: Optional[Dict] = None) -> Dict:
+        """
+        Enqueue a document, or return the existing job for the same document and config.
+
+        A job that previously failed is re-queued; queued, running and finished
+        jobs are returned unchanged.
+        """
+        config = config or {}
+        job_id = compute_job_id(document, config)
+        now = time.time()
+        conn = self._connect()
+        try:
+            # A failed BEGIN (e.g. "database is locked") has nothing to roll back
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None:
+                    conn.execute(
+                        'INSERT INTO jobs (id, document, config, status, created_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?)',
+                        (job_id, document, json.dumps(config, sort_keys=True), QUEUED, now, now)
+                    )
+                elif row['status'] == FAILED:
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, attempts = 0, error = NULL, pages_done = 0, '
+                        'updated_at = ? WHERE id = ?',
+                        (QUEUED, now, job_id)
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return the job record as a dict, or None if unknown."""
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job['config'] = json.loads(job['config'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Atomically hand the oldest runnable job to a worker.
+
+        Runnable jobs are queued jobs and running jobs whose lease has expired.
+        Returns None when there is nothing to do.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                while True:
+                    row = conn.execute(
+                        'SELECT id, attempts FROM jobs '
+                        'WHERE status = ? OR (status = ? AND heartbeat_at < ?) '
+                        'ORDER BY created_at LIMIT 1',
+                        (QUEUED, RUNNING, now - self.lease_seconds)
+                    ).fetchone()
+                    if row is None or row['attempts'] < self.max_attempts:
+                        break
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                        (FAILED, 'Exceeded maximum attempts', now, row['id'])
+                    )
+                if row is not None:
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, pages_done = 0, '
+                        'heartbeat_at = ?, updated_at = ? WHERE id = ?',
+                        (RUNNING, worker_id, now, now, row['id'])
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        return self.get(row['id']) if row is not None else None
+
+    def _update_owned(self, job_id: str, worker_id: str, assignments: str, params: tuple) -> bool:
+        """
+        Update a running job only if `worker_id` still holds its lease.
+
+        Returns False when the lease was lost (the job expired and was claimed
+        by another worker), so a stale worker can never overwrite its result.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                f'UPDATE jobs SET {assignments} WHERE id = ? AND worker = ? AND status = ?',
+                params + (job_id, worker_id, RUNNING)
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Refresh the worker's lease on a running job."""
+        now = time.time()
+        return self._update_owned(job_id, worker_id, 'heartbeat_at = ?, updated_at = ?', (now, now))
+
+    def update_progress(self, job_id: str, worker_id: str, pages_done: int, pages_total: int) -> bool:
+        """Record per-page progress and refresh the worker's lease."""
+        now = time.time()
+        return self._update_owned(
+            job_id, worker_id,
+            'pages_done = ?, pages_total = ?, heartbeat_at = ?, updated_at = ?',
+            (pages_done, pages_total, now, now)
+        )
+
+    def complete(self, job_id: str, worker_id: str, result: Dict) -> bool:
+        """Mark a job as done and store its final response."""
+        return self._update_owned(
+            job_id, worker_id,
+            'status = ?, result = ?, error = NULL, updated_at = ?',
+            (DONE, json.dumps(result), time.time())
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Mark a job as failed."""
+        return self._update_owned(
+            job_id, worker_id,
+            'status = ?, error = ?, updated_at = ?',
+            (FAILED, error, time.time())
+        )
@@ -0,0 +1,313 @@
+"""Load test the bill extraction API end to end.
+
+Serves the training PDFs from a local static HTTP server (a stand-in for remote
+document URLs), drives `/extract-bill-data` with closed-loop concurrency levels
+and/or open-loop Poisson arrival rates, and reports throughput, latency
+percentiles, error and 429 rates, and server CPU/RSS over time.
+
+Usage:
+    uvicorn app:app --workers 2 &
+    python load_test.py --concurrency 1,2,4,8 --duration 60 --server-pid <uvicorn pid>
+    python load_test.py --rates 0.5,1,2 --duration 60 --output load_report.json
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+import requests
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    """Static file handler that does not log every request."""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_document_server(directory: Path, host: str, port: int) -> ThreadingHTTPServer:
+    """Serve `directory` over HTTP in a background thread."""
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class ProcessMonitor:
+    """Sample CPU and RSS of the server processes from /proc at a fixed interval."""
+
+    def __init__(self, pids: List[int], interval: float = 1.0):
+        self.pids = pids
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._clock_ticks = os.sysconf('SC_CLK_TCK')
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+
+    def _read(self, pid: int):
+        """Return (cpu_seconds, rss_bytes) for a pid, or None if it has exited."""
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # Fields after the command name, which may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{pid}/statm') as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        # utime + stime, plus cutime + cstime: CPU of exited children (tesseract,
+        # pdftoppm) the process has waited for, which is gone from /proc by now
+        cpu_ticks = sum(int(v) for v in fields[11:15])
+        return cpu_ticks / self._clock_ticks, rss_pages * self._page_size
+
+    def _all_pids(self) -> List[int]:
+        """Monitored pids plus all their descendants (uvicorn workers, OCR pools, tesseract)."""
+        pids = []
+        seen = set()
+        stack = list(self.pids)
+        while stack:
+            pid = stack.pop()
+            if pid in seen:
+                continue
+            seen.add(pid)
+            pids.append(pid)
+            # Children are listed per thread; subprocesses started from the
+            # server's threadpool belong to those threads, not the main one
+            try:
+                tasks = os.listdir(f'/proc/{pid}/task')
+            except OSError:
+                continue
+            for task in tasks:
+                try:
+                    with open(f'/proc/{pid}/task/{task}/children') as f:
+                        stack.extend(int(c) for c in f.read().split())
+                except OSError:
+                    pass
+        return pids
+
+    def _snapshot(self):
+        cpu, rss = 0.0, 0
+        for pid in self._all_pids():
+            reading = self._read(pid)
+            if reading:
+                cpu += reading[0]
+                rss += reading[1]
+        return cpu, rss
+
+    def _run(self):
+        last_cpu, _ = self._snapshot()
+        start = last_t = time.monotonic()
+        while not self._stop.wait(self.interval):
+            cpu, rss = self._snapshot()
+            now = time.monotonic()
+            self.samples.append({
+                't': round(now - start, 2),
+                'cpu_percent': round(100.0 * (cpu - last_cpu) / (now - last_t), 1),
+                'rss_mb': round(rss / (1024 * 1024), 1)
+            })
+            last_cpu, last_t = cpu, now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def send_request(api_url: str, document: str, timeout: float, ocr_backend: Optional[str] = None,
+                 scheduled_start: Optional[float] = None) -> Dict:
+    """
+    Send one extraction request and record its outcome.
+
+    In open-loop mode `scheduled_start` is the request's intended arrival time:
+    latency is measured from it, so time spent waiting for a free client
+    thread counts against the server instead of being silently dropped
+    (coordinated omission).
+    """
+    payload = {"document": document}
+    if ocr_backend:
+        payload["ocr_backend"] = ocr_backend
+    start = time.monotonic() if scheduled_start is None else scheduled_start
+    try:
+        response = requests.post(api_url, json=payload, timeout=timeout)
+        status = response.status_code
+    except requests.RequestException as e:
+        status = None
+        error = type(e).__name__
+    else:
+        error = None
+    return {
+        'start': start,
+        'latency': time.monotonic() - start,
+        'status': status,
+        'error': error
+    }
+
+
+def run_closed_loop(api_url: str, documents: List[str], concurrency: int, duration: float,
+                    timeout: float, ocr_backend: Optional[str] = None) -> List[Dict]:
+    """Keep `concurrency` requests in flight for `duration` seconds."""
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            outcome = send_request(api_url, random.choice(documents), timeout, ocr_backend)
+            with lock:
+                results.append(outcome)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_open_loop(api_url: str, documents: List[str], rate: float, duration: float,
+                  timeout: float, max_in_flight: int, ocr_backend: Optional[str] = None) -> List[Dict]:
+    """Issue requests with Poisson arrivals at `rate` per second for `duration` seconds."""
+    futures = []
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        next_arrival = time.monotonic()
+        while next_arrival < deadline:
+            delay = next_arrival - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send_request, api_url, random.choice(documents), timeout,
+                                       ocr_backend, next_arrival))
+            next_arrival += random.expovariate(rate)
+    return [f.result() for f in futures]
+
+
+def summarize(name: str, results: List[Dict], elapsed: float, monitor: Optional[ProcessMonitor]) -> Dict:
+    """Aggregate raw results for one load profile."""
+    latencies = [r['latency'] for r in results if r['status'] == 200]
+    total = len(results)
+    errors = sum(1 for r in results if r['status'] != 200)
+    throttled = sum(1 for r in results if r['status'] == 429)
+    summary = {
+        'profile': name,
+        'requests': total,
+        'duration_s': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+        'p50_s': percentile(latencies, 50),
+        'p95_s': percentile(latencies, 95),
+        'p99_s': percentile(latencies, 99),
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'rate_429': round(throttled / total, 4) if total else 0.0,
+    }
+    if monitor is not None and monitor.samples:
+        summary['server_cpu_percent_max'] = max(s['cpu_percent'] for s in monitor.samples)
+        summary['server_rss_mb_max'] = max(s['rss_mb'] for s in monitor.samples)
+        summary['server_timeline'] = monitor.samples
+    return summary
+
+
+def print_summary(summary: Dict):
+    def fmt(v):
+        return f"{v:.2f}s" if v is not None else "-"
+
+    line = (f"{summary['profile']:<16} req={summary['requests']:<5} "
+            f"rps={summary['throughput_rps']:<7} p50={fmt(summary['p50_s']):<8} "
+            f"p95={fmt(summary['p95_s']):<8} p99={fmt(summary['p99_s']):<8} "
+            f"err={summary['error_rate']:.1%} 429={summary['rate_429']:.1%}")
+    if 'server_cpu_percent_max' in summary:
+        line += f" cpu_max={summary['server_cpu_percent_max']}% rss_max={summary['server_rss_mb_max']}MB"
+    print(line)
+
+
+def parse_list(value: str, cast) -> List:
+    return [cast(v) for v in value.split(',') if v.strip()] if value else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the bill extraction API")
+    parser.add_argument('--api-url', default="http://localhost:8000/extract-bill-data")
+    parser.add_argument('--samples-dir', default=str(Path(__file__).parent / "TRAINING_SAMPLES"))
+    parser.add_argument('--doc-host', default="127.0.0.1", help="Bind address of the document server")
+    parser.add_argument('--doc-port', type=int, default=8765, help="Port of the document server")
+    parser.add_argument('--concurrency', default="", help="Comma-separated closed-loop concurrency levels")
+    parser.add_argument('--rates', default="", help="Comma-separated open-loop arrival rates (req/s)")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds per profile")
+    parser.add_argument('--timeout', type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument('--max-in-flight', type=int, default=256, help="Open-loop client thread cap")
+    parser.add_argument('--server-pid', type=int, action='append', default=[],
+                        help="Server pid to monitor for CPU/RSS (repeatable)")
+    parser.add_argument('--ocr-backend', default=None, help="OCR backend requested per call (tesseract, paddle)")
+    parser.add_argument('--label', default="default", help="Deployment configuration label")
+    parser.add_argument('--output', default="load_report.json")
+    args = parser.parse_args()
+
+    concurrency_levels = parse_list(args.concurrency, int)
+    rates = parse_list(args.rates, float)
+    if not concurrency_levels and not rates:
+        concurrency_levels = [1, 2, 4, 8]
+
+    samples_dir = Path(args.samples_dir)
+    pdf_files = sorted(samples_dir.rglob("*.pdf"))
+    if not pdf_files:
+        print(f"No PDFs found under {samples_dir}")
+        sys.exit(1)
+
+    server = start_document_server(samples_dir, args.doc_host, args.doc_port)
+    base_url = f"http://{args.doc_host}:{args.doc_port}"
+    documents = [f"{base_url}/{p.relative_to(samples_dir).as_posix()}" for p in pdf_files]
+    print(f"Serving {len(documents)} documents from {base_url}")
+    print("=" * 80)
+
+    profiles = [(f"concurrency={c}", 'closed', c) for c in concurrency_levels]
+    profiles += [(f"rate={r}/s", 'open', r) for r in rates]
+
+    summaries = []
+    try:
+        for name, kind, value in profiles:
+            monitor = ProcessMonitor(args.server_pid) if args.server_pid else None
+            if monitor:
+                monitor.start()
+            start = time.monotonic()
+            if kind == 'closed':
+                results = run_closed_loop(args.api_url, documents, value, args.duration, args.timeout,
+                                          args.ocr_backend)
+            else:
+                results = run_open_loop(args.api_url, documents, value, args.duration,
+                                        args.timeout, args.max_in_flight, args.ocr_backend)
+            elapsed = time.monotonic() - start
+            if monitor:
+                monitor.stop()
+            summary = summarize(name, results, elapsed, monitor)
+            summaries.append(summary)
+            print_summary(summary)
+    finally:
+        server.shutdown()
+
+    with open(args.output, 'w') as f:
+        json.dump({'label': args.label, 'api_url': args.api_url, 'ocr_backend': args.ocr_backend,
+                   'profiles': summaries}, f, indent=2)
+    print("=" * 80)
+    print(f"Report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Pluggable OCR backends producing the token dicts consumed by `BillExtractor`.
+
+Every backend returns, per image, a list of tokens of the form:
+    {'x1', 'x2', 'y1', 'y2', 'text', 'conf' (0-1), 'box' (4 corner points)}
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+import cv2
+import numpy as np
+try:
+    import pytesseract
+    from pytesseract import Output
+except ImportError:
+    print("Warning: pytesseract not installed. Run: pip install pytesseract")
+    pytesseract = None
+
+
+DEFAULT_BACKEND = os.environ.get('OCR_BACKEND', 'tesseract')
+
+
+def preprocess_image(image: np.ndarray) -> np.ndarray:
+    """Preprocess image for better OCR results."""
+    # Convert to grayscale if needed
+    if len(image.shape) == 3:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    else:
+        gray = image
+
+    # Apply denoising
+    denoised = cv2.fastNlMeansDenoising(gray)
+
+    return denoised
+
+
+def make_token(x: int, y: int, w: int, h: int, text: str, conf: float) -> Dict:
+    """Build a token dict from an axis-aligned box."""
+    return {
+        'x1': x,
+        'x2': x + w,
+        'y1': y,
+        'y2': y + h,
+        'text': text,
+        'conf': conf,
+        'box': [[x, y], [x+w, y], [x+w, y+h], [x, y+h]]
+    }
+
+
+class OCRBackend(ABC):
+    """Base class for OCR backends."""
+
+    name = None
+    # Number of pages handed to `extract_tokens_batch` at once
+    batch_size = 1
+
+    @abstractmethod
+    def extract_tokens(self, image: np.ndarray) -> List[Dict]:
+        """Extract OCR tokens with bounding boxes from one image."""
+
+    def extract_tokens_batch(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        """Extract tokens from several images; backends that can batch override this."""
+        return [self.extract_tokens(image) for image in images]
+
+
+class TesseractBackend(OCRBackend):
+    """OCR with Tesseract through pytesseract (one subprocess per page)."""
+
+    name = 'tesseract'
+
+    def extract_tokens(self, image: np.ndarray) -> List[Dict]:
+        if pytesseract is None:
+            raise ImportError("pytesseract is not installed")
+
+        # Preprocess
+        processed = preprocess_image(image)
+
+        # Run OCR with bounding boxes
+        data = pytesseract.image_to_data(processed, output_type=Output.DICT)
+
+        tokens = []
+        n_boxes = len(data['text'])
+
+        for i in range(n_boxes):
+            text = data['text'][i].strip()
+            if not text:  # Skip empty text
+                continue
+
+            conf = float(data['conf'][i])
+            if conf < 0:  # Skip low confidence
+                continue
+
+            tokens.append(make_token(
+                data['left'][i], data['top'][i], data['width'][i], data['height'][i],
+                text, conf / 100.0  # Normalize to 0-1
+            ))
+
+        return tokens
+
+
+# PaddleOCR models, loaded once per process and keyed by language. Paddle
+# predictors are not thread-safe, so each model carries a lock that callers
+# hold while running it (API requests share one backend across threads).
+_paddle_models: Dict[str, Tuple[object, threading.Lock]] = {}
+_paddle_models_lock = threading.Lock()
+
+
+def load_paddle_model(lang: str = 'en', rec_batch_num: int = 32) -> Tuple[object, threading.Lock]:
+    """Load (or reuse) the CPU PaddleOCR model for this process, with its lock."""
+    with _paddle_models_lock:
+        if lang not in _paddle_models:
+            try:
+                from paddleocr import PaddleOCR
+            except ImportError:
+                raise ImportError("paddleocr is not installed. Run: pip install paddleocr paddlepaddle")
+            model = PaddleOCR(
+                lang=lang,
+                use_gpu=False,
+                use_angle_cls=False,
+                rec_batch_num=rec_batch_num,
+                show_log=False
+            )
+            _paddle_models[lang] = (model, threading.Lock())
+        return _paddle_models[lang]
+
+
+def crop_box(image: np.ndarray, box: np.ndarray) -> np.ndarray:
+    """Crop a (possibly rotated) quadrilateral text box to an upright image."""
+    box = box.astype(np.float32)
+    width = int(max(np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[2] - box[3])))
+    height = int(max(np.linalg.norm(box[0] - box[3]), np.linalg.norm(box[1] - box[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(box, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+    # Recognizer expects horizontal text; rotate tall crops
+    if height / width >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+class PaddleOCRBackend(OCRBackend):
+    """
+    OCR with PaddleOCR on CPU.
+
+    Text detection runs per page; the text crops of all pages in a batch are
+    then recognized together, so the recognizer sees large batches instead of
+    one page's worth of boxes at a time.
+    """
+
+    name = 'paddle'
+
+    def __init__(self, batch_size: int = 4, lang: str = 'en', min_score: float = 0.5):
+        """
+        Initialize backend.
+
+        Args:
+            batch_size: Pages per recognition call
+            lang: PaddleOCR language model
+            min_score: Recognition confidence below which tokens are dropped
+        """
+        self.batch_size = batch_size
+        self.lang = lang
+        self.min_score = min_score
+
+    def extract_tokens(self, image: np.ndarray) -> List[Dict]:
+        return self.extract_tokens_batch([image])[0]
+
+    def extract_tokens_batch(self, images: List[np.ndarray]) -> List[List[Dict]]:
+        model, lock = load_paddle_model(self.lang)
+
+        crops = []
+        owners = []  # (image index, box) for each crop
+        for index, image in enumerate(images):
+            # Pages are RGB (rendered PDFs and image files alike, see `OCREngine.load_images`);
+            # Paddle models expect BGR like cv2.imread
+            if len(image.shape) == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+            else:
+                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            with lock:
+                dt_boxes, _ = model.text_detector(image)
+            if dt_boxes is None:
+                continue
+            for box in dt_boxes:
+                crops.append(crop_box(image, np.asarray(box)))
+                owners.append((index, np.asarray(box)))
+
+        results = [[] for _ in images]
+        if not crops:
+            return results
+
+        with lock:
+            rec_res, _ = model.text_recognizer(crops)
+
+        for (index, box), (text, score) in zip(owners, rec_res):
+            text = text.strip()
+            if not text or score < self.min_score:
+                continue
+            x1, y1 = np.floor(box.min(axis=0)).astype(int)
+            x2, y2 = np.ceil(box.max(axis=0)).astype(int)
+            token = make_token(int(x1), int(y1), int(x2 - x1), int(y2 - y1), text, float(score))
+            token['box'] = box.astype(int).tolist()
+            results[index].append(token)
+
+        return results
+
+
+BACKENDS = {
+    TesseractBackend.name: TesseractBackend,
+    PaddleOCRBackend.name: PaddleOCRBackend,
+}
+
+
+def get_backend(name: str = None) -> OCRBackend:
+    """Create the backend registered under `name` (default: `OCR_BACKEND` env var)."""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}. Available: {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name]()
@@ -1,113 +1,106 @@
-"""OCR Engine using Tesseract (Pytesseract) - Windows compatible alternative."""
+"""OCR Engine with pluggable backends (Tesseract by default, PaddleOCR optional)."""
 import os
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 import cv2
 import numpy as np
-try:
-    import pytesseract
-    from pytesseract import Output
-except ImportError:
-    print("Warning: pytesseract not installed. Run: pip install pytesseract")
-    pytesseract = None
-from pdf2image import convert_from_path
 from PIL import Image
+import ocr_backends
+from ocr_backends import OCRBackend, get_backend
+from pdf_renderer import open_pdf
 
 
 class OCREngine:
-    """Wrapper around Tesseract OCR for document processing."""
+    """Document OCR: rasterizes pages and runs them through an OCR backend."""
     
-    def __init__(self):
-        """Initialize Tesseract OCR."""
+    def __init__(self, backend: Optional[str] = None, renderer: Optional[str] = None):
+        """
+        Initialize OCR engine.
+        
+        Args:
+            backend: Backend name ('tesseract' or 'paddle'); defaults to the
+                `OCR_BACKEND` environment variable, then 'tesseract'
+            renderer: PDF renderer ('pdfium' or 'poppler'); defaults to the
+                `PDF_RENDERER` environment variable, then 'pdfium'
+        """
         # If tesseract is not in PATH, you may need to set it manually:
         # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-        pass
+        self.backend: OCRBackend = get_backend(backend)
+        self.renderer = renderer
     
-    def pdf_to_images(self, pdf_path: str, dpi: int = 300) -> List[np.ndarray]:
-        """Convert PDF to list of images."""
+    def pdf_to_images(self, pdf_path: str, dpi: int = 300, first_page: int = 1,
+                      last_page: Optional[int] = None) -> List[np.ndarray]:
+        """Convert PDF (optionally only pages first_page..last_page, 1-based) to list of images."""
         try:
-            images = convert_from_path(pdf_path, dpi=dpi)
-            # Convert PIL images to numpy arrays
-            return [np.array(img) for img in images]
+            with open_pdf(pdf_path, self.renderer) as doc:
+                last = min(last_page or len(doc), len(doc))
+                return doc.render_pages(first_page - 1, last, dpi)
         except Exception as e:
             print(f"Error converting PDF: {e}")
             return []
     
+    def page_count(self, file_path: str) -> int:
+        """Number of pages in a document, read from the PDF structure without rasterizing."""
+        if os.path.splitext(file_path)[1].lower() != '.pdf':
+            return 1
+        with open_pdf(file_path, self.renderer) as doc:
+            return len(doc)
+    
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """Preprocess image for better OCR results."""
-        # Convert to grayscale if needed
-        if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image
-        
-        # Apply denoising
-        denoised = cv2.fastNlMeansDenoising(gray)
-        
-        return denoised
+        return ocr_backends.preprocess_image(image)
     
     def extract_tokens(self, image: np.ndarray) -> List[Dict]:
         """Extract OCR tokens with bounding boxes from image."""
-        if pytesseract is None:
-            raise ImportError("pytesseract is not installed")
-        
-        # Preprocess
-        processed = self.preprocess_image(image)
-        
-        # Run OCR with bounding boxes
-        data = pytesseract.image_to_data(processed, output_type=Output.DICT)
-        
-        tokens = []
-        n_boxes = len(data['text'])
+        return self.backend.extract_tokens(image)
+    
+    def load_images(self, file_path: str, first_page: int = 1,
+                    last_page: Optional[int] = None) -> List[np.ndarray]:
+        """Rasterize a PDF (or a page range of it) or load an image file into a list of page images."""
+        ext = os.path.splitext(file_path)[1].lower()
         
-        for i in range(n_boxes):
-            text = data['text'][i].strip()
-            if not text:  # Skip empty text
-                continue
-            
-            conf = float(data['conf'][i])
-            if conf < 0:  # Skip low confidence
-                continue
-            
-            x = data['left'][i]
-            y = data['top'][i]
-            w = data['width'][i]
-            h = data['height'][i]
-            
-            tokens.append({
-                'x1': x,
-                'x2': x + w,
-                'y1': y,
-                'y2': y + h,
-                'text': text,
-                'conf': conf / 100.0,  # Normalize to 0-1
-                'box': [[x, y], [x+w, y], [x+w, y+h], [x, y+h]]
-            })
+        if ext == '.pdf':
+            return self.pdf_to_images(file_path, first_page=first_page, last_page=last_page)
         
-        return tokens
+        # Single image; pages are RGB like rendered PDF pages, whatever the backend
+        img = cv2.imread(file_path)
+        if img is None:
+            # Try with PIL
+            pil_img = Image.open(file_path)
+            img = np.array(pil_img.convert('RGB'))
+        else:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return [img]
     
-    def process_document(self, file_path: str) -> List[Tuple[int, List[Dict]]]:
+    def process_document(
+        self,
+        file_path: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        first_page: int = 1,
+        last_page: Optional[int] = None
+    ) -> List[Tuple[int, List[Dict]]]:
         """
         Process a document (PDF or image) and return OCR tokens for each page.
         
+        Args:
+            file_path: Path to a PDF or image file
+            progress_callback: Optional callable invoked as (pages_done, pages_total)
+                after each page is OCR'd
+            first_page: First PDF page to process (1-based)
+            last_page: Last PDF page to process (inclusive); defaults to the last page
+        
         Returns:
             List of (page_number, tokens) tuples
         """
-        ext = os.path.splitext(file_path)[1].lower()
-        
-        if ext == '.pdf':
-            images = self.pdf_to_images(file_path)
-        else:
-            # Single image
-            img = cv2.imread(file_path)
-            if img is None:
-                # Try with PIL
-                pil_img = Image.open(file_path)
-                img = np.array(pil_img)
-            images = [img]
+        images = self.load_images(file_path, first_page, last_page)
         
         results = []
-        for page_num, image in enumerate(images, start=1):
-            tokens = self.extract_tokens(image)
-            results.append((page_num, tokens))
+        batch_size = max(1, self.backend.batch_size)
+        for start in range(0, len(images), batch_size):
+            batch = images[start:start + batch_size]
+            for offset, tokens in enumerate(self.backend.extract_tokens_batch(batch)):
+                page_num = first_page + start + offset
+                results.append((page_num, tokens))
+                if progress_callback is not None:
+                    progress_callback(start + offset + 1, len(images))
         
         return results
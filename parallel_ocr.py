@@ -0,0 +1,433 @@
+"""Multi-process OCR with zero-copy page handoff through shared memory.
+
+The parent rasterizes pages into `multiprocessing.shared_memory` segments taken
+from a reusable pool (rendering PDFs straight into them when the renderer
+supports it); OCR workers map the same segment as a NumPy array
+without copying it and send tokens back in a packed columnar form instead of
+a pickled list of dicts. Pages are sent in groups of the backend's
+`batch_size`, so batching backends (PaddleOCR) still recognize several pages
+per call inside each worker. Segments are owned by the parent only, so a
+crashed worker cannot leak them: they are released when the batch's future
+resolves (successfully or not) and unlinked when the pool is closed.
+"""
+import atexit
+import collections
+import itertools
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from ocr_engine import OCREngine
+from ocr_backends import get_backend
+from pdf_renderer import open_pdf
+
+
+class SharedPagePool:
+    """Fixed number of reusable shared-memory segments for page images."""
+
+    def __init__(self, slots: int):
+        """
+        Initialize pool.
+
+        Args:
+            slots: Maximum number of pages in flight; also bounds shared memory use
+        """
+        self._segments: List[Optional[shared_memory.SharedMemory]] = [None] * slots
+        self._free = list(range(slots))
+        self._cond = threading.Condition()
+        # Waiters are served in arrival order so a batch is not starved by single pages
+        self._tickets = itertools.count()
+        self._waiting = collections.deque()
+        self._closed = False
+        atexit.register(self.close)
+
+    def acquire(self, nbytes: int) -> Tuple[int, shared_memory.SharedMemory]:
+        """Block until a slot is free and return it with a segment of at least `nbytes`."""
+        return self.acquire_many([nbytes])[0]
+
+    def acquire_many(self, sizes: List[int]) -> List[Tuple[int, shared_memory.SharedMemory]]:
+        """
+        Block until `len(sizes)` slots are free and take them all at once.
+
+        Taking a batch's slots in one step means no caller ever holds part of a
+        batch while waiting for the rest, which would deadlock concurrent callers.
+        """
+        if len(sizes) > len(self._segments):
+            raise ValueError(f"Cannot acquire {len(sizes)} slots from a pool of {len(self._segments)}")
+        with self._cond:
+            ticket = next(self._tickets)
+            self._waiting.append(ticket)
+            while self._waiting[0] != ticket or len(self._free) < len(sizes):
+                self._cond.wait()
+            self._waiting.popleft()
+            slots = [self._free.pop() for _ in sizes]
+            # The next waiter in line may be satisfiable with what is left
+            self._cond.notify_all()
+        return [(slot, self._segment(slot, nbytes)) for slot, nbytes in zip(slots, sizes)]
+
+    def _segment(self, slot: int, nbytes: int) -> shared_memory.SharedMemory:
+        segment = self._segments[slot]
+        if segment is None or segment.size < nbytes:
+            # First use or a larger page than before: replace the segment
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+            segment = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._segments[slot] = segment
+        return segment
+
+    def release(self, slot: int):
+        """Return a slot to the pool; its segment is kept for reuse."""
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify_all()
+
+    def close(self):
+        """Unlink every segment. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        for segment in self._segments:
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+        self._segments = [None] * len(self._segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Packed token layout: header (count, text bytes), then int32 coords
+# [x1, y1, x2, y2, 8 box values] per token, float32 conf, uint32 text offsets
+# (count + 1) and the UTF-8 text of all tokens concatenated.
+_HEADER = struct.Struct('<II')
+_COORDS = 12
+
+
+def pack_tokens(tokens: List[Dict]) -> bytes:
+    """Encode tokens into a compact columnar byte string."""
+    n = len(tokens)
+    coords = np.empty((n, _COORDS), dtype=np.int32)
+    conf = np.empty(n, dtype=np.float32)
+    encoded = []
+    for i, t in enumerate(tokens):
+        coords[i, :4] = (t['x1'], t['y1'], t['x2'], t['y2'])
+        coords[i, 4:] = np.asarray(t['box'], dtype=np.int32).reshape(8)
+        conf[i] = t['conf']
+        encoded.append(t['text'].encode('utf-8'))
+    offsets = np.zeros(n + 1, dtype=np.uint32)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    text = b''.join(encoded)
+    return b''.join((_HEADER.pack(n, len(text)), coords.tobytes(), conf.tobytes(), offsets.tobytes(), text))
+
+
+def unpack_tokens(data: bytes) -> List[Dict]:
+    """Decode tokens produced by `pack_tokens`."""
+    n, text_len = _HEADER.unpack_from(data)
+    pos = _HEADER.size
+    coords = np.frombuffer(data, dtype=np.int32, count=n * _COORDS, offset=pos).reshape(n, _COORDS)
+    pos += coords.nbytes
+    conf = np.frombuffer(data, dtype=np.float32, count=n, offset=pos)
+    pos += conf.nbytes
+    offsets = np.frombuffer(data, dtype=np.uint32, count=n + 1, offset=pos)
+    pos += offsets.nbytes
+    text = data[pos:pos + text_len]
+
+    tokens = []
+    for i, row in enumerate(coords.tolist()):
+        tokens.append({
+            'x1': row[0],
+            'x2': row[2],
+            'y1': row[1],
+            'y2': row[3],
+            'text': text[offsets[i]:offsets[i + 1]].decode('utf-8'),
+            'conf': float(conf[i]),
+            'box': [row[4:6], row[6:8], row[8:10], row[10:12]]
+        })
+    return tokens
+
+
+# Per-worker state, created by the pool initializer
+_worker_backend = None
+_worker_segments: Dict[str, shared_memory.SharedMemory] = {}
+_MAX_ATTACHED = 32
+
+
+def _init_worker(backend_name: str):
+    """Load the OCR backend once per worker process."""
+    global _worker_backend
+    _worker_backend = get_backend(backend_name)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to a segment, reusing the mapping across pages that share a slot."""
+    segment = _worker_segments.get(name)
+    if segment is None:
+        if len(_worker_segments) >= _MAX_ATTACHED:
+            # Segments are replaced when pages grow; drop the oldest mappings
+            oldest = next(iter(_worker_segments))
+            _worker_segments.pop(oldest).close()
+        segment = shared_memory.SharedMemory(name=name)
+        _worker_segments[name] = segment
+    return segment
+
+
+def _ocr_pages(pages: List[Tuple[str, Tuple[int, ...], str]]) -> Tuple[List[bytes], Dict[str, float]]:
+    """Worker task: OCR the pages stored in the given (segment name, shape, dtype) slots as one batch."""
+    t0 = time.perf_counter()
+    images = [
+        np.ndarray(shape, dtype=np.dtype(dtype), buffer=_attach(name).buf)
+        for name, shape, dtype in pages
+    ]
+    t1 = time.perf_counter()
+    token_lists = _worker_backend.extract_tokens_batch(images)
+    del images
+    t2 = time.perf_counter()
+    packed = [pack_tokens(tokens) for tokens in token_lists]
+    t3 = time.perf_counter()
+    return packed, {'attach_s': t1 - t0, 'ocr_s': t2 - t1, 'pack_s': t3 - t2}
+
+
+class ParallelOCR:
+    """
+    Drop-in replacement for `OCREngine.process_document` that OCRs pages in a process pool.
+
+    Page images are handed to workers through a `SharedPagePool`; the
+    `stats` attribute accumulates the per-page IPC cost so it can be compared
+    with OCR time.
+    """
+
+    def __init__(self, engine: OCREngine, processes: int = os.cpu_count() or 1,
+                 slots: Optional[int] = None):
+        """
+        Initialize parallel OCR.
+
+        Args:
+            engine: Engine used for rasterization; its backend is loaded in each worker
+            processes: Number of OCR worker processes
+            slots: Pages in flight (shared-memory segments); defaults to two
+                batches per worker
+        """
+        self.engine = engine
+        self.backend = engine.backend
+        self.renderer = engine.renderer
+        self.processes = processes
+        slots = slots or 2 * processes * max(1, self.backend.batch_size)
+        # A batch takes all its slots at once, so it can never be larger than the pool
+        self.batch_size = max(1, min(self.backend.batch_size, slots))
+        self.pool = SharedPagePool(slots)
+        self.executor = self._start_executor()
+        self._executor_lock = threading.Lock()
+        self.stats = {
+            'pages': 0, 'copy_in_s': 0.0, 'attach_s': 0.0, 'pack_s': 0.0,
+            'unpack_s': 0.0, 'ocr_s': 0.0, 'result_bytes': 0
+        }
+        self._stats_lock = threading.Lock()
+
+    def _start_executor(self) -> ProcessPoolExecutor:
+        # Spawn rather than fork: the API process is multi-threaded
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.backend.name,)
+        )
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        """
+        Replace a pool broken by a dead worker (e.g. OOM-killed) so later documents still run.
+
+        Every caller with work in the broken pool gets here; only the first
+        one replaces it, so work already sent to the new pool is not cancelled.
+        """
+        with self._executor_lock:
+            if self.executor is not broken:
+                return
+            self.executor = self._start_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, batch: List[Tuple[int, str, Tuple[int, ...], str]]) -> Tuple[Future, ProcessPoolExecutor]:
+        """
+        Send a batch of filled slots to the pool; the slots are released when it resolves.
+
+        Returns the future and the executor it was submitted to.
+        """
+        slots = [slot for slot, _, _, _ in batch]
+
+        def release(_):
+            for slot in slots:
+                self.pool.release(slot)
+
+        pages = [page for _, *page in batch]
+        try:
+            executor = self.executor
+            try:
+                future = executor.submit(_ocr_pages, pages)
+            except BrokenProcessPool:
+                # The pool broke after its last caller left (nobody replaced it yet);
+                # the batch never ran, so send it to a fresh pool
+                self._replace_executor(executor)
+                executor = self.executor
+                future = executor.submit(_ocr_pages, pages)
+        except BaseException:
+            # No future to attach the release to
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future, executor
+
+    def _run_pages(
+        self,
+        pages: Iterable[Tuple[Tuple[int, ...], np.dtype, Callable[[np.ndarray], None], bool]],
+        total: int,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        first_page: int = 1
+    ) -> List[Tuple[int, List[Dict]]]:
+        """
+        Write each page into a shared-memory slot and OCR it in the worker pool.
+
+        Args:
+            pages: (shape, dtype, fill, is_copy) per page; `fill` writes the page
+                into the array it is given, `is_copy` marks fills that copy an
+                existing image (counted as IPC) rather than render in place
+            total: Number of pages, for progress reporting
+            first_page: Page number of the first page
+        """
+        futures = []
+        broken = None
+        pages = iter(pages)
+        try:
+            while True:
+                batch_pages = list(itertools.islice(pages, self.batch_size))
+                if not batch_pages:
+                    break
+                acquired = self.pool.acquire_many([
+                    int(np.prod(shape)) * np.dtype(dtype).itemsize for shape, dtype, _, _ in batch_pages
+                ])
+                batch = []  # (slot, segment name, shape, dtype)
+                copy_s = 0.0
+                try:
+                    for (slot, segment), (shape, dtype, fill, is_copy) in zip(acquired, batch_pages):
+                        t0 = time.perf_counter()
+                        fill(np.ndarray(shape, dtype=dtype, buffer=segment.buf))
+                        if is_copy:
+                            copy_s += time.perf_counter() - t0
+                        batch.append((slot, segment.name, tuple(shape), np.dtype(dtype).str))
+                except BaseException:
+                    for slot, _ in acquired:
+                        self.pool.release(slot)
+                    raise
+                future, executor = self._submit(batch)
+                futures.append((future, copy_s, executor))
+
+            results = []
+            for future, copy_s, executor in futures:
+                try:
+                    packed_pages, timings = future.result()
+                except BrokenProcessPool:
+                    broken = executor
+                    self._replace_executor(executor)
+                    raise
+                t0 = time.perf_counter()
+                token_lists = [unpack_tokens(packed) for packed in packed_pages]
+                unpack_s = time.perf_counter() - t0
+                with self._stats_lock:
+                    self.stats['pages'] += len(packed_pages)
+                    self.stats['copy_in_s'] += copy_s
+                    self.stats['unpack_s'] += unpack_s
+                    self.stats['result_bytes'] += sum(len(packed) for packed in packed_pages)
+                    for key, value in timings.items():
+                        self.stats[key] += value
+                for tokens in token_lists:
+                    results.append((first_page + len(results), tokens))
+                    if progress_callback is not None:
+                        progress_callback(len(results), total)
+            return results
+        finally:
+            # A failed or crashed batch must not leave the others running and holding slots.
+            # Futures of a broken pool fail on their own; cancelling them races with the
+            # executor's own clean-up thread, which then logs InvalidStateError
+            for future, _, executor in futures:
+                if executor is not broken:
+                    future.cancel()
+
+    def process_images(
+        self,
+        images: List[np.ndarray],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        first_page: int = 1
+    ) -> List[Tuple[int, List[Dict]]]:
+        """OCR page images in the worker pool and return (page_number, tokens) tuples."""
+        def copy_into(image):
+            def fill(out):
+                out[...] = image
+            return fill
+
+        pages = ((image.shape, image.dtype, copy_into(image), True) for image in images)
+        return self._run_pages(pages, len(images), progress_callback, first_page)
+
+    def process_document(
+        self,
+        file_path: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        first_page: int = 1,
+        last_page: Optional[int] = None,
+        dpi: int = 300
+    ) -> List[Tuple[int, List[Dict]]]:
+        """
+        Same contract as `OCREngine.process_document`.
+
+        PDFs opened with an in-place renderer are rasterized straight into the
+        shared-memory segments, one page at a time as slots free up.
+        """
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            with open_pdf(file_path, self.engine.renderer) as doc:
+                last = min(last_page or len(doc), len(doc))
+                if doc.renders_in_place:
+                    def render_into(index):
+                        def fill(out):
+                            doc.render_page(index, dpi, out=out)
+                        return fill
+
+                    pages = (
+                        (doc.page_shape(i, dpi), np.uint8, render_into(i), False)
+                        for i in range(first_page - 1, last)
+                    )
+                    return self._run_pages(pages, last - first_page + 1, progress_callback, first_page)
+        images = self.engine.load_images(file_path, first_page, last_page)
+        return self.process_images(images, progress_callback, first_page)
+
+    def page_count(self, file_path: str) -> int:
+        """Same contract as `OCREngine.page_count`."""
+        return self.engine.page_count(file_path)
+
+    def ipc_overhead_ms_per_page(self) -> float:
+        """Mean time per page spent moving data between processes (not OCR)."""
+        with self._stats_lock:
+            pages = self.stats['pages']
+            if not pages:
+                return 0.0
+            ipc = (self.stats['copy_in_s'] + self.stats['attach_s'] +
+                   self.stats['pack_s'] + self.stats['unpack_s'])
+        return 1000.0 * ipc / pages
+
+    def close(self):
+        """Stop workers and unlink all shared memory."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,195 @@
+"""PDF rasterization backends.
+
+`pdfium` renders in-process with pypdfium2: page counts come from the PDF
+structure, pages are rendered one at a time on demand, directly into a
+caller-supplied NumPy buffer, with no subprocess and no temporary files.
+`poppler` is the previous pdf2image/pdftoppm path, kept as a fallback.
+"""
+import ctypes
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+import numpy as np
+from pdf2image import convert_from_path, pdfinfo_from_path
+try:
+    import pypdfium2 as pdfium
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = None
+
+
+DEFAULT_RENDERER = os.environ.get('PDF_RENDERER', 'pdfium')
+
+# PDFium is not thread-safe; all calls into it are serialized
+_pdfium_lock = threading.Lock()
+
+
+def page_pixels(points: float, dpi: int) -> int:
+    """Pixel size of a page dimension, rounded like pdftoppm."""
+    return int(math.ceil(points * dpi / 72.0))
+
+
+class PdfDocument(ABC):
+    """An open PDF that can be rasterized page by page."""
+
+    # Whether `render_page(out=...)` writes pixels straight into `out`
+    renders_in_place = False
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of pages."""
+
+    @abstractmethod
+    def page_shape(self, index: int, dpi: int) -> Tuple[int, int, int]:
+        """Shape (height, width, 3) of page `index` rendered at `dpi`."""
+
+    @abstractmethod
+    def render_page(self, index: int, dpi: int = 300, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Render page `index` (0-based) as an RGB uint8 array.
+
+        Args:
+            index: Page index
+            dpi: Resolution
+            out: Optional C-contiguous array of shape `page_shape(index, dpi)` to render into
+        """
+
+    def render_pages(self, start: int, stop: int, dpi: int = 300) -> List[np.ndarray]:
+        """Render pages `start` to `stop - 1` (0-based) as RGB uint8 arrays."""
+        return [self.render_page(i, dpi) for i in range(start, stop)]
+
+    def has_text_layer(self, index: int) -> bool:
+        """Whether page `index` carries embedded text (False when unknown)."""
+        return False
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PdfiumDocument(PdfDocument):
+    """In-process rendering with PDFium."""
+
+    renders_in_place = True
+
+    def __init__(self, path: str):
+        with _pdfium_lock:
+            self.pdf = pdfium.PdfDocument(path)
+            self.page_count = len(self.pdf)
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def page_shape(self, index: int, dpi: int) -> Tuple[int, int, int]:
+        with _pdfium_lock:
+            # Read from the page tree; no FPDF_LoadPage/ClosePage round trip
+            width, height = self.pdf.get_page_size(index)
+        return page_pixels(height, dpi), page_pixels(width, dpi), 3
+
+    def render_page(self, index: int, dpi: int = 300, out: Optional[np.ndarray] = None) -> np.ndarray:
+        shape = self.page_shape(index, dpi)
+        if out is None:
+            out = np.empty(shape, dtype=np.uint8)
+        elif out.shape != shape or out.dtype != np.uint8 or not out.flags['C_CONTIGUOUS']:
+            raise ValueError(f"Output buffer must be a C-contiguous uint8 array of shape {shape}")
+        height, width, _ = shape
+
+        with _pdfium_lock:
+            page = self.pdf[index]
+            # Wrap the caller's buffer as a PDFium bitmap so pixels land in it directly
+            bitmap = pdfium_c.FPDFBitmap_CreateEx(
+                width, height, pdfium_c.FPDFBitmap_BGR,
+                out.ctypes.data_as(ctypes.c_void_p), width * 3
+            )
+            try:
+                pdfium_c.FPDFBitmap_FillRect(bitmap, 0, 0, width, height, 0xFFFFFFFF)
+                pdfium_c.FPDF_RenderPageBitmap(
+                    bitmap, page.raw, 0, 0, width, height, 0,
+                    # RGB byte order, matching pdf2image output
+                    pdfium_c.FPDF_ANNOT | pdfium_c.FPDF_REVERSE_BYTE_ORDER
+                )
+            finally:
+                pdfium_c.FPDFBitmap_Destroy(bitmap)
+                page.close()
+        return out
+
+    def has_text_layer(self, index: int) -> bool:
+        with _pdfium_lock:
+            page = self.pdf[index]
+            textpage = page.get_textpage()
+            try:
+                return textpage.count_chars() > 0
+            finally:
+                textpage.close()
+                page.close()
+
+    def close(self):
+        with _pdfium_lock:
+            self.pdf.close()
+
+
+class PopplerDocument(PdfDocument):
+    """
+    Rendering through pdf2image, which runs `pdftoppm` once per call.
+
+    Use `render_pages` for page ranges: it renders the whole range with a
+    single `pdftoppm` run instead of one per page.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.page_count = int(pdfinfo_from_path(path)['Pages'])
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def page_shape(self, index: int, dpi: int) -> Tuple[int, int, int]:
+        # pdftoppm offers no cheap way to get the rendered size
+        return self.render_page(index, dpi).shape
+
+    def render_page(self, index: int, dpi: int = 300, out: Optional[np.ndarray] = None) -> np.ndarray:
+        images = convert_from_path(self.path, dpi=dpi, first_page=index + 1, last_page=index + 1)
+        image = np.array(images[0].convert('RGB'))
+        if out is None:
+            return image
+        out[...] = image
+        return out
+
+    def render_pages(self, start: int, stop: int, dpi: int = 300) -> List[np.ndarray]:
+        if start >= stop:
+            return []
+        images = convert_from_path(self.path, dpi=dpi, first_page=start + 1, last_page=stop)
+        return [np.array(image.convert('RGB')) for image in images]
+
+
+RENDERERS = {
+    'pdfium': PdfiumDocument,
+    'poppler': PopplerDocument,
+}
+
+
+def open_pdf(path: str, renderer: Optional[str] = None) -> PdfDocument:
+    """
+    Open a PDF with the requested renderer (default: `PDF_RENDERER` env var, then pdfium).
+
+    Falls back to poppler when pypdfium2 is not installed or cannot open the file.
+    """
+    name = renderer or DEFAULT_RENDERER
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown PDF renderer: {name}. Available: {', '.join(sorted(RENDERERS))}")
+    if name == 'pdfium':
+        if pdfium is None:
+            print("Warning: pypdfium2 not installed, falling back to poppler. Run: pip install pypdfium2")
+        else:
+            try:
+                return PdfiumDocument(path)
+            except pdfium.PdfiumError as e:
+                print(f"Warning: pdfium could not open {path} ({e}), falling back to poppler")
+    return PopplerDocument(path)
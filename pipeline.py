@@ -0,0 +1,62 @@
+"""Shared extraction pipeline used by the API and the background job workers."""
+import os
+from typing import Callable, Dict, Optional
+from ocr_engine import OCREngine
+from extractor import BillExtractor
+from utils import download_file
+
+
+class ExtractionError(Exception):
+    """Raised when a document cannot be processed."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def run_extraction(
+    document: str,
+    ocr_engine: OCREngine,
+    extractor: BillExtractor,
+    progress_callback: Optional[Callable[[int, int], None]] = None
+) -> Dict:
+    """
+    Run OCR and extraction on a document URL or local path.
+
+    Args:
+        document: HTTP(S) URL or local file path
+        ocr_engine: OCR engine used to tokenize pages (`OCREngine` or `ParallelOCR`)
+        extractor: Extractor that turns page tokens into bill data
+        progress_callback: Optional callable invoked as (pages_done, pages_total)
+
+    Returns:
+        Extracted bill data (the `data` field of the API response)
+    """
+    temp_file = None
+    try:
+        if document.startswith('http://') or document.startswith('https://'):
+            # Download from URL
+            temp_file = download_file(document)
+            file_path = temp_file
+        else:
+            # Local file path
+            file_path = document
+            if not os.path.exists(file_path):
+                raise ExtractionError(f"File not found: {file_path}", status_code=400)
+
+        # Process document with OCR
+        page_tokens = ocr_engine.process_document(file_path, progress_callback=progress_callback)
+
+        if not page_tokens:
+            raise ExtractionError("Failed to extract text from document")
+
+        # Extract structured data
+        return extractor.extract_from_document(page_tokens)
+
+    finally:
+        # Cleanup temp file
+        if temp_file and os.path.exists(temp_file):
+            try:
+                os.unlink(temp_file)
+            except OSError:
+                pass
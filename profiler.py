@@ -0,0 +1,182 @@
+"""Opt-in sampling profiler for the extraction pipeline.
+
+A profile is only captured when a request asks for it with the admin token or
+when it is picked by the configured sample rate; otherwise nothing is started.
+While active, a background thread samples the stack of the request thread (and
+of any thread doing work on the request's behalf, such as the OCR scheduler
+threads, see `sample_current_thread`) and writes folded stacks (`frame;frame;frame count`) that flamegraph.pl, speedscope
+and inferno can load directly. Because sampling is wall-clock based, time spent
+waiting on the tesseract and pdftoppm subprocesses shows up as well.
+
+Configuration (environment variables):
+    PROFILE_ADMIN_TOKEN   Token required by the `X-Profile` request header
+    PROFILE_SAMPLE_RATE   Fraction of requests profiled automatically (default 0)
+    PROFILE_DIR           Output directory (default `profiles`)
+    PROFILE_MAX_FILES     Number of profiles kept before the oldest are removed (default 50)
+    PROFILE_INTERVAL_MS   Sampling interval in milliseconds (default 5)
+"""
+import contextvars
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Optional
+
+
+ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN')
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+
+
+class StackSampler:
+    """Periodically sample the stacks of a set of threads and count folded stacks."""
+
+    def __init__(self, thread_id: int, interval: float = INTERVAL_MS / 1000.0):
+        """
+        Initialize sampler.
+
+        Args:
+            thread_id: Ident of the thread to sample; more can be added with `add_thread`
+            interval: Seconds between samples
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._thread_ids = {thread_id}
+        self._ids_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def add_thread(self, thread_id: int):
+        with self._ids_lock:
+            self._thread_ids.add(thread_id)
+
+    def remove_thread(self, thread_id: int):
+        with self._ids_lock:
+            self._thread_ids.discard(thread_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._ids_lock:
+                thread_ids = list(self._thread_ids)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                    stack.append(f"{module}.{code.co_name}")
+                    frame = frame.f_back
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def write_folded(self, path: str):
+        """Write samples in folded-stack format."""
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def should_profile(header_value: Optional[str], admin_token: Optional[str]) -> bool:
+    """Decide whether the current request is profiled."""
+    # Constant-time comparison so the token cannot be guessed from response timing;
+    # compared as bytes because compare_digest rejects non-ASCII str
+    if header_value and ADMIN_TOKEN and admin_token and hmac.compare_digest(
+            admin_token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+
+def _mtime(path: str) -> float:
+    """Modification time, or 0 for a file removed concurrently (e.g. by another worker)."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+def rotate_profiles(directory: str = PROFILE_DIR, max_files: int = MAX_FILES):
+    """Delete the oldest profiles so at most `max_files` remain."""
+    files = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith('.folded')
+    ]
+    files.sort(key=_mtime)
+    for path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# Sampler of the profile active in the current context, if any
+_current_sampler: contextvars.ContextVar[Optional[StackSampler]] = contextvars.ContextVar(
+    'current_sampler', default=None
+)
+
+
+def current_sampler() -> Optional[StackSampler]:
+    """Sampler profiling the calling context, to hand to threads that work on its behalf."""
+    return _current_sampler.get()
+
+
+@contextmanager
+def sample_current_thread(sampler: Optional[StackSampler]) -> Iterator[None]:
+    """Include the calling thread in `sampler`'s profile for the enclosed block (no-op if None)."""
+    if sampler is None:
+        yield
+        return
+    thread_id = threading.get_ident()
+    sampler.add_thread(thread_id)
+    try:
+        yield
+    finally:
+        sampler.remove_thread(thread_id)
+
+
+@contextmanager
+def _profile(label: str):
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    token = _current_sampler.set(sampler)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_sampler.reset(token)
+        sampler.stop()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{elapsed_ms:.0f}ms-{os.getpid()}-{sampler.thread_id}.folded"
+        # A full disk or a read-only directory must not fail the profiled request
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            sampler.write_folded(os.path.join(PROFILE_DIR, name))
+            rotate_profiles()
+        except OSError as e:
+            print(f"Warning: could not write profile {name}: {e}")
+
+
+def maybe_profile(enabled: bool, label: str = 'request'):
+    """
+    Return a context manager that profiles the enclosed block if enabled.
+
+    When disabled this is a no-op `nullcontext`, so untriggered requests pay nothing.
+    """
+    if not enabled:
+        return nullcontext()
+    return _profile(label)
@@ -0,0 +1,244 @@
+"""Cost-aware scheduling of OCR work.
+
+Every document gets a cost estimate before any OCR runs (pixels to OCR, from
+the PDF structure or the image header). Work is split into page-range tasks
+and handed to a fixed number of OCR threads in shortest-expected-job-first
+order with aging: a task's priority is
+
+    task_cost - aging_rate * seconds_waited
+
+A document's tasks are queued one at a time: its next page range enters the
+queue when the previous one is picked up, and only starts waiting then. So a
+100-page packet competes chunk by chunk, each chunk priced like a short
+document, and one-page receipts keep overtaking it for as long as it runs
+(waiting for at most the chunks already running), while the packet still
+finishes because waiting steadily lowers its priority. Since every queued task
+ages at the same rate, this ordering is equivalent to sorting by
+`task_cost + aging_rate * enqueue_time`, which is what the heap uses.
+"""
+import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+from PIL import Image
+from pdf_renderer import open_pdf
+from profiler import current_sampler, sample_current_thread
+
+
+SCHEDULER_WORKERS = int(os.environ.get('SCHEDULER_WORKERS', '0'))
+# Cost units (megapixels) forgiven per second of waiting
+AGING_RATE = float(os.environ.get('SCHEDULER_AGING_RATE', '10'))
+CHUNK_PAGES = int(os.environ.get('SCHEDULER_CHUNK_PAGES', '4'))
+# Relative cost of pages with an embedded text layer. Every page is OCR'd
+# today, so the default is 1; lower it once a text-layer fast path exists.
+TEXT_LAYER_FACTOR = float(os.environ.get('SCHEDULER_TEXT_LAYER_FACTOR', '1'))
+
+
+def estimate_cost(file_path: str, renderer: Optional[str] = None, dpi: int = 300) -> Dict:
+    """
+    Estimate the OCR cost of a document without rasterizing it.
+
+    Returns:
+        Dict with `pages`, `megapixels`, `text_layer_pages`, `cost` and
+        `page_costs` (cost of each page)
+    """
+    if os.path.splitext(file_path)[1].lower() == '.pdf':
+        with open_pdf(file_path, renderer) as doc:
+            pages = len(doc)
+            megapixels = 0.0
+            text_layer_pages = 0
+            page_costs = []
+            # Loading pages for their text layer is the slow part; skip it when it cannot change the cost
+            check_text = TEXT_LAYER_FACTOR != 1.0
+            for i in range(pages):
+                height, width, _ = doc.page_shape(i, dpi) if doc.renders_in_place else (3508, 2480, 3)
+                page_mp = height * width / 1e6
+                has_text = check_text and doc.has_text_layer(i)
+                megapixels += page_mp
+                text_layer_pages += int(has_text)
+                page_costs.append(page_mp * (TEXT_LAYER_FACTOR if has_text else 1.0))
+            cost = sum(page_costs)
+    else:
+        # Only the header is read to get the size
+        with Image.open(file_path) as img:
+            width, height = img.size
+        pages = 1
+        megapixels = cost = width * height / 1e6
+        page_costs = [cost]
+        text_layer_pages = 0
+
+    return {
+        'pages': pages,
+        'megapixels': round(megapixels, 2),
+        'text_layer_pages': text_layer_pages,
+        'cost': cost,
+        'page_costs': page_costs
+    }
+
+
+class _Job:
+    """Book-keeping for one submitted document."""
+
+    def __init__(self, file_path: str, estimate: Dict, chunks: List[Tuple[int, Optional[int], float]],
+                 progress_callback: Optional[Callable[[int, int], None]]):
+        self.file_path = file_path
+        self.estimate = estimate
+        # (first_page, last_page, cost) of chunks not yet queued
+        self.pending = collections.deque(chunks)
+        self.remaining = len(chunks)
+        self.pages_done = 0
+        self.results: List[Tuple[int, List[Dict]]] = []
+        self.progress_callback = progress_callback
+        # Profile of the submitting request, sampled on whichever thread runs a chunk
+        self.sampler = current_sampler()
+        self.future = Future()
+        self.future.set_running_or_notify_cancel()
+        self.lock = threading.Lock()
+
+    def page_done(self):
+        with self.lock:
+            self.pages_done += 1
+            done = self.pages_done
+        if self.progress_callback is not None:
+            self.progress_callback(done, self.estimate['pages'])
+
+    def chunk_done(self, pages: List[Tuple[int, List[Dict]]]):
+        with self.lock:
+            self.results.extend(pages)
+            self.remaining -= 1
+            finished = self.remaining == 0
+        if finished and not self.future.done():
+            self.future.set_result(sorted(self.results, key=lambda p: p[0]))
+
+    def fail(self, error: Exception):
+        with self.lock:
+            if not self.future.done():
+                self.future.set_exception(error)
+
+
+class CostScheduler:
+    """
+    Drop-in wrapper around an OCR engine that schedules documents by expected cost.
+
+    Exposes `process_document` and `page_count` like `OCREngine`, so it can be
+    passed anywhere an engine is expected.
+    """
+
+    def __init__(self, ocr_engine, workers: int = 2, chunk_pages: int = CHUNK_PAGES,
+                 aging_rate: float = AGING_RATE):
+        """
+        Initialize scheduler.
+
+        Args:
+            ocr_engine: `OCREngine` or `ParallelOCR` that does the actual work
+            workers: Number of page-range tasks processed concurrently
+            chunk_pages: Pages per task when splitting PDFs
+            aging_rate: Cost units (megapixels) forgiven per second of waiting
+        """
+        self.ocr_engine = ocr_engine
+        self.backend = ocr_engine.backend
+        self.chunk_pages = chunk_pages
+        self.aging_rate = aging_rate
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'ocr-scheduler-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, file_path: str,
+               progress_callback: Optional[Callable[[int, int], None]] = None) -> Future:
+        """Queue a document; the future resolves to (page_number, tokens) tuples."""
+        estimate = estimate_cost(file_path, getattr(self.ocr_engine, 'renderer', None))
+        pages = estimate['pages']
+        page_costs = estimate['page_costs']
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            chunks = []
+            for first in range(1, pages + 1, self.chunk_pages):
+                last = min(first + self.chunk_pages - 1, pages)
+                chunks.append((first, last, sum(page_costs[first - 1:last])))
+        else:
+            chunks = [(1, None, estimate['cost'])]
+        if not chunks:
+            # Empty PDF: nothing to OCR
+            job = _Job(file_path, estimate, [], progress_callback)
+            job.future.set_result([])
+            return job.future
+
+        job = _Job(file_path, estimate, chunks, progress_callback)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler is closed")
+            self._queue_next(job)
+        return job.future
+
+    def _queue_next(self, job: _Job):
+        """Queue the job's next chunk, aging from now. Called with `_cond` held."""
+        if not job.pending or job.future.done():
+            return
+        first, last, cost = job.pending.popleft()
+        key = cost + self.aging_rate * time.monotonic()
+        heapq.heappush(self._heap, (key, next(self._seq), job, first, last))
+        self._cond.notify()
+
+    def process_document(
+        self,
+        file_path: str,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> List[Tuple[int, List[Dict]]]:
+        """Same contract as `OCREngine.process_document`; blocks until the document is done."""
+        return self.submit(file_path, progress_callback).result()
+
+    def page_count(self, file_path: str) -> int:
+        return self.ocr_engine.page_count(file_path)
+
+    def queue_depth(self) -> int:
+        """Number of page-range tasks waiting to run, including chunks not queued yet."""
+        with self._cond:
+            return sum(1 + len(job.pending) for _, _, job, _, _ in self._heap)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                _, _, job, first, last = heapq.heappop(self._heap)
+                # The next chunk starts competing now, so idle threads can still
+                # work on the same document in parallel
+                self._queue_next(job)
+
+            if job.future.done():
+                # Another chunk of this job already failed
+                continue
+            try:
+                with sample_current_thread(job.sampler):
+                    pages = self.ocr_engine.process_document(
+                        job.file_path,
+                        progress_callback=lambda done, total: job.page_done(),
+                        first_page=first,
+                        last_page=last
+                    )
+            except Exception as e:
+                job.fail(e)
+                continue
+            job.chunk_done(pages)
+
+    def close(self):
+        """Finish queued work, stop the threads and close the wrapped engine if it needs it."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+        if hasattr(self.ocr_engine, 'close'):
+            self.ocr_engine.close()
@@ -0,0 +1,97 @@
+"""Column template inference and assignment on a synthetic bill table.
+
+Run with `python -m pytest test_column_template.py` or `python test_column_template.py`.
+"""
+from extractor import BillExtractor
+
+
+# Right edges of the Qty, Rate and Amount columns
+QTY_X, RATE_X, AMOUNT_X = 1000, 1300, 1600
+
+
+def token(text, x2, y, width=80):
+    return {'text': text, 'x1': x2 - width, 'x2': x2, 'y1': y, 'y2': y + 30, 'conf': 90.0}
+
+
+def item_row(name, qty, rate, amount, y):
+    return [
+        token(name, 500, y, width=300),
+        token(qty, QTY_X, y),
+        token(rate, RATE_X, y),
+        token(amount, AMOUNT_X, y),
+    ]
+
+
+def bill_page():
+    tokens = [
+        token('Item', 300, 100), token('Qty', QTY_X, 100),
+        token('Rate', RATE_X, 100), token('Amount', AMOUNT_X, 100),
+    ]
+    y = 200
+    for name, qty, rate in [('Consultation', 1, 250), ('Saline bottle', 2, 120),
+                            ('Syringe', 3, 45), ('Room charges', 1, 980)]:
+        tokens += item_row(name, str(qty), f'{rate}.00', f'{qty * rate}.00', y)
+        y += 60
+    # Footer with small numbers: skipped as an item row, so it must not become a column
+    tokens += [token('Page', 760, y + 100), token('1', 820, y + 100),
+               token('of', 850, y + 100), token('2', 880, y + 100)]
+    return tokens
+
+
+def make_extractor():
+    return BillExtractor(min_column_support=2)
+
+
+def numbers_at(*pairs):
+    return [{'value': value, 'x': x2 - 80, 'x2': x2} for value, x2 in pairs]
+
+
+def test_infer_column_template_finds_table_columns():
+    extractor = make_extractor()
+    template = extractor.infer_column_template([(1, bill_page()), (2, bill_page())])
+
+    assert template is not None
+    assert [round(c) for c in template.centers] == [QTY_X, RATE_X, AMOUNT_X]
+    assert template.roles == ['quantity', 'rate', 'amount']
+
+
+def test_infer_column_template_without_numbers():
+    extractor = make_extractor()
+    assert extractor.infer_column_template([(1, [token('Discharge summary', 600, 100)])]) is None
+
+
+def test_assign_columns_by_position():
+    extractor = make_extractor()
+    template = extractor.infer_column_template([(1, bill_page()), (2, bill_page())])
+
+    # Full row
+    assert extractor.assign_columns(numbers_at((2, QTY_X), (120, RATE_X), (240, AMOUNT_X)), template) == (240, 120, 2)
+    # Missing rate is derived from amount / quantity, even though quantity is
+    # a large number the right-to-left heuristic would take for a rate
+    assert extractor.assign_columns(numbers_at((150, QTY_X + 10), (300, AMOUNT_X - 5)), template) == (300, 2.0, 150)
+    # Amount only
+    assert extractor.assign_columns(numbers_at((99, AMOUNT_X)), template) == (99, 99, 1.0)
+
+
+def test_rows_that_do_not_fit_fall_back_to_heuristic():
+    extractor = make_extractor()
+    template = extractor.infer_column_template([(1, bill_page()), (2, bill_page())])
+
+    # No number in the amount column
+    assert extractor.assign_columns(numbers_at((5, 700), (50, 1150)), template) is None
+    # Several numbers but only the amount matches a column
+    assert extractor.assign_columns(numbers_at((3, 700), (75, AMOUNT_X)), template) is None
+
+    row = [token('Dressing kit', 500, 900, width=300), token('3', 700, 900), token('75.00', AMOUNT_X, 900)]
+    item = extractor.extract_row_data(row, template)
+    assert item == extractor.extract_row_data(row)
+    assert item['item_amount'] == 75.0
+    assert item['item_quantity'] == 3.0
+    assert item['item_rate'] == 25.0
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")
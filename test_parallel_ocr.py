@@ -0,0 +1,128 @@
+"""Shared-memory page pool, token packing and batch submission of `ParallelOCR`.
+
+Run with `python -m pytest test_parallel_ocr.py` or `python test_parallel_ocr.py`.
+No OCR engine is needed: OCR runs in threads with a stub batching backend.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import parallel_ocr
+from ocr_backends import OCRBackend, make_token
+from ocr_engine import OCREngine
+from parallel_ocr import ParallelOCR, SharedPagePool, pack_tokens, unpack_tokens
+
+
+class StubBatchBackend(OCRBackend):
+    """Returns one token per page holding the page's first pixel value."""
+
+    name = 'stub-batch'
+    batch_size = 4
+
+    def extract_tokens(self, image):
+        return self.extract_tokens_batch([image])[0]
+
+    def extract_tokens_batch(self, images):
+        time.sleep(0.05)
+        return [[make_token(0, 0, 10, 10, str(int(image.flat[0])), 0.9)] for image in images]
+
+
+def make_parallel_ocr(slots):
+    engine = OCREngine()
+    engine.backend = StubBatchBackend()
+    ocr = ParallelOCR(engine, processes=1, slots=slots)
+    # Run `_ocr_pages` in threads of this process instead of spawned workers
+    ocr.executor.shutdown()
+    ocr.executor = ThreadPoolExecutor(max_workers=2)
+    parallel_ocr._worker_backend = engine.backend
+    return ocr
+
+
+def slow_pages(values):
+    """Page specs whose fill takes a while, so concurrent callers interleave."""
+    def fill_with(value):
+        def fill(out):
+            time.sleep(0.05)
+            out[...] = value
+        return fill
+    return [((8, 8, 3), np.uint8, fill_with(v), True) for v in values]
+
+
+def test_pack_unpack_roundtrip():
+    tokens = [
+        make_token(10, 20, 30, 40, 'Paracetamol', 0.875),
+        make_token(0, 0, 5, 5, '₹1,250.00', 0.5),
+        make_token(7, 8, 9, 10, '', 1.0),
+    ]
+    tokens[1]['box'] = [[1, 2], [3, 4], [5, 6], [7, 8]]
+
+    assert unpack_tokens(pack_tokens(tokens)) == tokens
+    assert unpack_tokens(pack_tokens([])) == []
+
+
+def test_acquire_many_takes_all_slots_at_once():
+    with SharedPagePool(4) as pool:
+        held = [slot for slot, _ in pool.acquire_many([64, 64, 64])]
+        got = []
+        waiter = threading.Thread(target=lambda: got.extend(pool.acquire_many([64, 64])))
+        waiter.start()
+        time.sleep(0.1)
+        # One slot is free but two are needed: nothing is taken yet
+        assert got == [] and len(pool._free) == 1
+
+        pool.release(held.pop())
+        waiter.join(timeout=5)
+        assert len(got) == 2 and pool._free == []
+        assert all(segment.size >= 64 for _, segment in got)
+
+
+def test_concurrent_partial_batches_do_not_deadlock():
+    # Two callers with 3 pages each and a 4-slot pool: holding slots of a
+    # partly filled batch while waiting for more would starve both of them
+    ocr = make_parallel_ocr(slots=4)
+    try:
+        results = {}
+
+        def run(name, values):
+            results[name] = ocr._run_pages(iter(slow_pages(values)), len(values))
+
+        threads = [
+            threading.Thread(target=run, args=('a', [1, 2, 3]), daemon=True),
+            threading.Thread(target=run, args=('b', [4, 5, 6]), daemon=True),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+
+        assert not any(t.is_alive() for t in threads), "callers deadlocked on the slot pool"
+        assert [tokens[0]['text'] for _, tokens in results['a']] == ['1', '2', '3']
+        assert [tokens[0]['text'] for _, tokens in results['b']] == ['4', '5', '6']
+        assert sorted(ocr.pool._free) == [0, 1, 2, 3]
+    finally:
+        ocr.close()
+
+
+def test_failed_fill_releases_batch_slots():
+    ocr = make_parallel_ocr(slots=4)
+    try:
+        def broken(out):
+            raise ValueError("render failed")
+
+        pages = slow_pages([1]) + [((8, 8, 3), np.uint8, broken, False)]
+        try:
+            ocr._run_pages(iter(pages), 2)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("fill error was swallowed")
+        assert sorted(ocr.pool._free) == [0, 1, 2, 3]
+    finally:
+        ocr.close()
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,114 @@
+"""Background worker processes that drain the extraction job queue.
+
+Usage:
+    python worker.py --workers 2 --db jobs.db
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Dict
+from ocr_engine import OCREngine
+from extractor import BillExtractor
+from job_queue import JobQueue, DEFAULT_DB_PATH
+from pipeline import run_extraction
+from profiler import maybe_profile, should_profile
+
+
+def build_response(data: Dict) -> Dict:
+    """Wrap extracted data in the `ExtractionResponse` shape returned by the API."""
+    return {
+        'is_success': True,
+        'token_usage': {'total_tokens': 0, 'input_tokens': 0, 'output_tokens': 0},
+        'data': data
+    }
+
+
+def keep_lease(queue: JobQueue, job_id: str, worker_id: str, stop: threading.Event):
+    """
+    Refresh the job's heartbeat until `stop` is set.
+
+    Runs in a background thread so long pages (or a slow download) never let
+    the lease expire while the job is still being worked on.
+    """
+    interval = queue.lease_seconds / 3
+    while not stop.wait(interval):
+        try:
+            if not queue.heartbeat(job_id, worker_id):
+                # Lease already lost to another worker; nothing left to keep alive
+                return
+        except Exception as e:
+            print(f"Worker {worker_id} could not renew lease on job {job_id}: {e}")
+
+
+def run_worker(db_path: str, poll_interval: float = 1.0):
+    """Claim and process jobs forever. OCR and extraction engines are loaded once."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(db_path)
+    ocr_engines = {}
+    extractors = {}
+
+    print(f"Worker {worker_id} started")
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        job_id = job['id']
+        y_tolerance = job['config'].get('y_tolerance', 12)
+        if y_tolerance not in extractors:
+            extractors[y_tolerance] = BillExtractor(y_tolerance=y_tolerance)
+        backend = job['config'].get('ocr_backend')
+
+        def on_progress(pages_done: int, pages_total: int):
+            queue.update_progress(job_id, worker_id, pages_done, pages_total)
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=keep_lease, args=(queue, job_id, worker_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            if backend not in ocr_engines:
+                ocr_engines[backend] = OCREngine(backend=backend)
+            with maybe_profile(should_profile(None, None), label='job'):
+                data = run_extraction(job['document'], ocr_engines[backend], extractors[y_tolerance], on_progress)
+            if queue.complete(job_id, worker_id, build_response(data)):
+                print(f"Worker {worker_id} finished job {job_id}")
+            else:
+                print(f"Worker {worker_id} lost the lease on job {job_id}; result discarded")
+        except Exception as e:
+            queue.fail(job_id, worker_id, f"Error processing document: {str(e)}")
+            print(f"Worker {worker_id} failed job {job_id}: {e}")
+        finally:
+            stop.set()
+            heartbeat.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run extraction job workers")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Path to the SQLite job database")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle")
+    args = parser.parse_args()
+
+    # Create the schema once before workers race for it
+    JobQueue(args.db)
+
+    processes = []
+    for _ in range(args.workers):
+        p = multiprocessing.Process(target=run_worker, args=(args.db, args.poll_interval))
+        p.start()
+        processes.append(p)
+
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()